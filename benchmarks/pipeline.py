@@ -0,0 +1,131 @@
+"""Benchmarks the encoding and decoding pipeline against simulated slow storage.
+
+Slow storage, such as a network filesystem, is simulated by adding a fixed latency to
+every read and write made by the CLI. Each operation is run serially (a queue depth of
+zero) and then with the threaded pipeline, and the output of both is compared to ensure
+it is byte-identical.
+
+    python benchmarks/pipeline.py --size 96788 --latency 0.02
+
+"""
+
+import argparse
+import filecmp
+import io
+import logging
+import os
+import pathlib
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Callable
+from unittest import mock
+
+# Allow running from a checkout, without xKey being installed.
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from xkey import cli, pipeline  # noqa: E402
+
+
+class SlowFile(io.RawIOBase):
+    """Wraps a file, adding a fixed latency to every read and write."""
+
+    def __init__(self, fileobj: Any, latency: float):
+        self.fileobj = fileobj
+        self.latency = latency
+
+    def read(self, size: int = -1) -> bytes:
+        time.sleep(self.latency)
+        return self.fileobj.read(size)
+
+    def write(self, buffer: Any) -> int:
+        time.sleep(self.latency)
+        return self.fileobj.write(buffer)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self.fileobj.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self.fileobj.tell()
+
+    def truncate(self, size: Any = None) -> int:
+        return self.fileobj.truncate(size)
+
+    def close(self):
+        self.fileobj.close()
+        super().close()
+
+
+def timed(operation: Callable[[], int], latency: float) -> float:
+    """Runs an operation with slow storage, returning the time taken in seconds."""
+
+    def slow_open(*args: Any, **kwargs: Any) -> SlowFile:
+        return SlowFile(open(*args, **kwargs), latency)
+
+    with mock.patch.object(cli, "open", slow_open, create=True):
+        start = time.perf_counter()
+        if operation() != 0:
+            raise RuntimeError("Operation failed")
+
+        return time.perf_counter() - start
+
+
+def main():
+    """Runs the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=96788)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--block-size", type=int, default=pipeline.DEFAULT_BLOCK_SIZE)
+    parser.add_argument("--queue-depth", type=int, default=pipeline.DEFAULT_QUEUE_DEPTH)
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    workdir = tempfile.mkdtemp()
+
+    try:
+        binary = os.path.join(workdir, "firmware.bin")
+        with open(binary, "wb") as fout:
+            fout.write(os.urandom(arguments.size))
+
+        print(
+            f"{arguments.size}-bytes, {arguments.latency}s latency per I/O, "
+            f"{arguments.block_size}-byte blocks, queue depth {arguments.queue_depth}"
+        )
+
+        for name, suffix, operation in [
+            (
+                "encode",
+                ".syx",
+                lambda depth: cli.encode(
+                    binary, "flkey", 217, arguments.block_size, depth
+                ),
+            ),
+            (
+                "decode",
+                ".syx.bin",
+                lambda depth: cli.decode(
+                    f"{binary}.syx", arguments.block_size, depth
+                ),
+            ),
+        ]:
+            serial = timed(lambda: operation(0), arguments.latency)
+            shutil.move(f"{binary}{suffix}", f"{binary}{suffix}.serial")
+
+            depth = arguments.queue_depth
+            threaded = timed(lambda: operation(depth), arguments.latency)
+            if not filecmp.cmp(
+                f"{binary}{suffix}", f"{binary}{suffix}.serial", shallow=False
+            ):
+                raise RuntimeError(f"Output of {name} differs between runs")
+
+            print(
+                f"{name}: serial {serial:.3f}s, pipelined {threaded:.3f}s "
+                f"({serial / threaded:.2f}x)"
+            )
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Implements fixtures shared between tests."""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from xkey import cli
+
+
+class FirmwareTestCase(unittest.TestCase):
+    """Provides a random binary firmware image in a temporary directory."""
+
+    # The size of the generated firmware image, in bytes.
+    size = 4099
+
+    def setUp(self):
+        """Operations to perform before a test case is run."""
+        self.workdir = tempfile.mkdtemp()
+        self.binary = os.path.join(self.workdir, "firmware.bin")
+        self.expected = bytes(
+            random.Random(217).getrandbits(8) for _ in range(self.size)
+        )
+
+        with open(self.binary, "wb") as fout:
+            fout.write(self.expected)
+
+    def tearDown(self):
+        """Operations to perform after a test case has run."""
+        shutil.rmtree(self.workdir)
+
+    def read(self, path):
+        """Returns the contents of the given file."""
+        with open(path, "rb") as fin:
+            return fin.read()
+
+    def encode(self, *args):
+        """Encodes the firmware image to SysEx, returning the encoded contents."""
+        self.assertEqual(cli.encode(self.binary, "flkey", 217, *args), 0)
+
+        return self.read(f"{self.binary}.syx")
@@ -0,0 +1,122 @@
+"""Implements tests for the xKey CLI."""
+
+import argparse
+import hashlib
+import os
+
+from tests.fixture import FirmwareTestCase
+from xkey import cli
+
+
+class xKeyCliTestCase(FirmwareTestCase):
+    """Implements tests for the xKey CLI."""
+
+    def test_round_trip(self):
+        """Ensure output is identical regardless of block size and queue depth."""
+        expected = None
+
+        for block_size, depth in [(1, 0), (32, 1), (100, 4), (65536, 4)]:
+            encoded = self.encode(block_size, depth)
+            expected = expected or encoded
+
+            self.assertEqual(encoded, expected)
+            self.assertEqual(cli.decode(f"{self.binary}.syx", block_size, depth), 0)
+            self.assertEqual(self.read(f"{self.binary}.syx.bin"), self.expected)
+
+    def test_golden(self):
+        """Ensure output matches that of the original serial encoder."""
+        # SHA-256 of the SysEx generated by the original encoder for 'bytes(range(N))'.
+        candidates = [
+            (
+                100,
+                217,
+                "40a008fdf9eb62e944126c21f023f5ca260a2a9f7c6b3d7ee03b703959c39c08",
+            ),
+            (
+                20,
+                217,
+                "7732eae176b595dda4fcca656b619ade83929be1b5e3ffaedac1fea7ac2f86a7",
+            ),
+            (
+                100,
+                999999,
+                "20f7e6e853ff6b5092bdee9412a4017f8dd4c01a75774976cab0c6c012a7990d",
+            ),
+            (
+                100,
+                1234567,
+                "4ceffdd8061cba24bc61f46613ac5cc50e07d50456af3431ff926f907cf62e83",
+            ),
+        ]
+        binary = os.path.join(self.workdir, "golden.bin")
+
+        for size, build, expected in candidates:
+            with open(binary, "wb") as fout:
+                fout.write(bytes(range(size)))
+
+            for block_size, depth in [(32, 0), (32, 1), (4096, 4)]:
+                self.assertEqual(
+                    cli.encode(binary, "launchkey-mk3", build, block_size, depth), 0
+                )
+                self.assertEqual(
+                    hashlib.sha256(self.read(f"{binary}.syx")).hexdigest(), expected
+                )
+
+    def test_decode_invalid(self):
+        """Ensure invalid SysEx fails to decode, and no output is left behind."""
+        encoded = self.encode()
+
+        with open(f"{self.binary}.syx", "wb") as fout:
+            fout.write(encoded[:-1])
+
+        self.assertEqual(cli.decode(f"{self.binary}.syx"), 1)
+        self.assertFalse(os.path.exists(f"{self.binary}.syx.bin"))
+
+    def test_failure_preserves_output(self):
+        """Ensure a failed run leaves any existing output untouched."""
+        with open(f"{self.binary}.syx", "wb") as fout:
+            fout.write(b"existing")
+
+        os.remove(self.binary)
+
+        self.assertEqual(cli.encode(self.binary, "flkey", 217), 1)
+        self.assertEqual(self.read(f"{self.binary}.syx"), b"existing")
+        self.assertEqual(os.listdir(self.workdir), ["firmware.bin.syx"])
+
+    def test_stale_temporary_file(self):
+        """Ensure a temporary file left behind by an earlier run is not reused."""
+        with open(f"{self.binary}.syx.{os.getpid()}.tmp", "wb") as fout:
+            fout.write(b"stale")
+
+        self.encode()
+        self.assertEqual(
+            sorted(os.listdir(self.workdir)),
+            ["firmware.bin", "firmware.bin.syx", f"firmware.bin.syx.{os.getpid()}.tmp"],
+        )
+
+    def test_bounded_integer(self):
+        """Ensure integer arguments are parsed and checked against their minimum."""
+        parse = cli._bounded_integer(1)
+
+        self.assertEqual(parse("32"), 32)
+        self.assertEqual(parse("0x20"), 32)
+
+        for value in ["0", "-1", "abc"]:
+            with self.assertRaises(argparse.ArgumentTypeError):
+                parse(value)
+
+    def test_extract(self):
+        """Ensure a range of bytes is extracted from SysEx."""
+        self.encode()
+        self.assertEqual(cli.extract(f"{self.binary}.syx", 0x10, 0x100), 0)
+
+        self.assertEqual(
+            self.read(f"{self.binary}.syx.0x00000010-0x100.bin"),
+            self.expected[0x10:0x110],
+        )
+        self.assertEqual(cli.extract(f"{self.binary}.syx", 0x10, 0x20), 0)
+        self.assertEqual(
+            self.read(f"{self.binary}.syx.0x00000010-0x20.bin"),
+            self.expected[0x10:0x30],
+        )
+        self.assertEqual(cli.extract(f"{self.binary}.syx", 4096, 4), 1)
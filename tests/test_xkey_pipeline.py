@@ -0,0 +1,95 @@
+"""Implements tests for the bounded-queue pipeline."""
+
+import itertools
+import threading
+import time
+import unittest
+
+from xkey import pipeline
+
+
+class xKeyPipelineTestCase(unittest.TestCase):
+    """Implements tests for the bounded-queue pipeline."""
+
+    def test_run_order(self):
+        """Ensure items are written in order, regardless of queue depth."""
+        for depth in [0, 1, 4]:
+            output = []
+            pipeline.run(
+                range(100),
+                lambda items: (item * 2 for item in items),
+                output.append,
+                depth,
+            )
+
+            self.assertEqual(output, [item * 2 for item in range(100)])
+
+    def test_run_transform_flush(self):
+        """Ensure a transform may yield trailing items once the input is exhausted."""
+
+        def transform(items):
+            total = 0
+            for item in items:
+                total += item
+                yield item
+
+            yield total
+
+        output = []
+        pipeline.run(range(5), transform, output.append, 2)
+
+        self.assertEqual(output, [0, 1, 2, 3, 4, 10])
+
+    def test_run_reader_error(self):
+        """Ensure errors raised by the reader are raised to the caller."""
+
+        def reader():
+            yield 1
+            raise OSError("reader")
+
+        with self.assertRaisesRegex(OSError, "reader"):
+            pipeline.run(reader(), lambda items: items, lambda item: None, 1)
+
+    def test_run_transform_error(self):
+        """Ensure errors raised by the transform are raised to the caller."""
+
+        def transform(items):
+            for item in items:
+                raise ValueError("transform")
+                yield item
+
+        with self.assertRaisesRegex(ValueError, "transform"):
+            pipeline.run(range(100), transform, lambda item: None, 1)
+
+    def test_run_writer_error(self):
+        """Ensure errors raised by the writer are raised to the caller."""
+
+        def writer(item):
+            raise OSError("writer")
+
+        with self.assertRaisesRegex(OSError, "writer"):
+            pipeline.run(range(100), lambda items: items, writer, 1)
+
+    def test_run_negative_depth(self):
+        """Ensure a negative queue depth is rejected."""
+        with self.assertRaises(ValueError):
+            pipeline.run(range(100), lambda items: items, lambda item: None, -1)
+
+    def test_run_stops_blocked_stages(self):
+        """Ensure stages blocked on a full queue are stopped when another fails."""
+        threads = threading.active_count()
+        written = []
+
+        def writer(item):
+            # Writing slowly ensures the reader and transform fill their queues.
+            time.sleep(0.01)
+            if len(written) == 5:
+                raise OSError("writer")
+
+            written.append(item)
+
+        with self.assertRaisesRegex(OSError, "writer"):
+            pipeline.run(itertools.count(), lambda items: items, writer, 1)
+
+        self.assertEqual(written, [0, 1, 2, 3, 4])
+        self.assertEqual(threading.active_count(), threads)
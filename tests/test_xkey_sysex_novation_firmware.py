@@ -0,0 +1,48 @@
+"""Implements tests for random access to Novation SysEx firmware."""
+
+import io
+
+from tests.fixture import FirmwareTestCase
+from xkey.sysex.novation import firmware
+
+
+class xKeySysExNovationFirmwareTestCase(FirmwareTestCase):
+    """Implements tests for random access to Novation SysEx firmware."""
+
+    size = 1000
+
+    def setUp(self):
+        """Operations to perform before a test case is run."""
+        super().setUp()
+        self.encoded = self.encode()
+
+    def test_metadata(self):
+        """Ensure metadata is read from the SysEx file."""
+        image = firmware.Firmware(io.BytesIO(self.encoded))
+
+        self.assertEqual(image.build, "000217")
+        self.assertEqual(image.size, len(self.expected))
+        self.assertEqual(image.chunks, 32)
+
+    def test_read(self):
+        """Ensure ranges of the firmware are decoded correctly."""
+        image = firmware.Firmware(io.BytesIO(self.encoded))
+
+        ranges = [(0, 0), (0, 4), (30, 4), (31, 64), (500, 500), (0, 1000)]
+
+        for offset, length in ranges:
+            self.assertEqual(
+                image.read(offset, length), self.expected[offset : offset + length]
+            )
+
+        with self.assertRaises(ValueError):
+            image.read(999, 2)
+
+        with self.assertRaises(ValueError):
+            image.read(-1, 2)
+
+    def test_invalid(self):
+        """Ensure files which do not match the expected layout are rejected."""
+        for candidate in [self.encoded[:-1], self.encoded[44:], bytes()]:
+            with self.assertRaises(ValueError):
+                firmware.Firmware(io.BytesIO(candidate))
@@ -12,37 +12,53 @@ Currently supported devices include:
 """
 
 import argparse
+import contextlib
 import logging
+import os
 import pathlib
 import sys
+import tempfile
+from typing import BinaryIO, Callable, Iterator, Optional
 
+from xkey import pipeline
 from xkey.__about__ import __version__
-from xkey.sysex.novation import codec, constant, message
+from xkey.sysex.novation import codec, constant, firmware, message
 
 
 # mypy: disable-error-code="attr-defined"
-def encode(filename: str, model: str, build: int) -> int:
+def encode(
+    filename: str,
+    model: str,
+    build: int,
+    block_size: int = pipeline.DEFAULT_BLOCK_SIZE,
+    depth: int = pipeline.DEFAULT_QUEUE_DEPTH,
+) -> int:
     """Encodes Encodes a binary file to Novation compatible SysEx.
 
     :param filename: The name and path to the file to encode.
     :param model: A supported Novation model name.
     :param build: The build number to encode in this SysEx file.
+    :param block_size: The size of blocks to read from the input file, in bytes. This
+        will be rounded up to a whole number of chunks.
+    :param depth: The maximum number of blocks queued between pipeline stages. Zero
+        disables the use of threads.
 
     :return: An exit code indicating if the operation was successful or not. Zero
         means success, any other value failure.
     """
     logger = logging.getLogger(__name__)
-    buffer = bytearray()
-    decoded = bytearray()
-    encoded = bytearray()
 
     # Required to be calculated for metadata.
-    crc = int()
+    crc = 0xFFFFFFFF
     size = int()
 
     in_path = pathlib.Path(filename).resolve()
     out_path = f"{in_path}.syx"
 
+    # Blocks must contain a whole number of chunks.
+    chunks = -(-block_size // constant.FIELD_CHUNK_SIZE)
+    block_size = chunks * constant.FIELD_CHUNK_SIZE
+
     # Do horrible things with integers to get them into the desired format.
     build_string = str(build).rjust(constant.FIELD_BUILD_SIZE, "0")
     build_number = bytearray(constant.FIELD_BUILD_SIZE)
@@ -57,25 +73,29 @@ def encode(filename: str, model: str, build: int) -> int:
     start.model = constant.MODEL_IDS[model]
     start.build = build_number
 
-    try:
-        logger.info(f"Reading binary from {in_path}")
+    def transform(blocks: Iterator[bytearray]) -> Iterator[bytearray]:
+        nonlocal crc, size
+        first = None
 
-        with open(in_path, "rb") as fin:
-            # First chunk is handled last - to account for the final "carry".
-            fin.seek(constant.FIELD_CHUNK_SIZE)
+        for block in blocks:
+            # Track the raw / unencoded value - as this will be required for both size
+            # and CRC later.
+            crc = codec.crc32(block, crc)
+            size += len(block)
 
-            while True:
-                buffer = bytearray(fin.read(constant.FIELD_CHUNK_SIZE))
-                if len(buffer) < 1:
-                    break
+            # The first chunk is handled last - to account for the final "carry".
+            skip = 0
+            if first is None:
+                first = block[0 : constant.FIELD_CHUNK_SIZE]
+                skip = constant.FIELD_CHUNK_SIZE
 
-                # Track the raw / unencoded value - as this will be required for both
-                # size and CRC later.
-                decoded.extend(buffer)
+            encoded = bytearray()
+            for offset in range(skip, len(block), constant.FIELD_CHUNK_SIZE):
+                buffer = block[offset : offset + constant.FIELD_CHUNK_SIZE]
 
                 # Pad the final chunk to the required number of bytes. This must ONLY
-                # be done the buffer to be encoded, not the 'decoded' buffer - as the
-                # CRC and size are generated for the raw data.
+                # be done the buffer to be encoded, as the CRC and size are generated
+                # for the raw data.
                 if len(buffer) < constant.FIELD_CHUNK_SIZE:
                     buffer.extend([0xFF] * (constant.FIELD_CHUNK_SIZE - len(buffer)))
 
@@ -84,65 +104,81 @@ def encode(filename: str, model: str, build: int) -> int:
                 data.chunk = codec.encoder(buffer)
                 encoded.extend(data.to_bytes())
 
-            # Handle the first chunk last.
-            fin.seek(0)
-            end = message.End()
-            buffer = bytearray(fin.read(constant.FIELD_CHUNK_SIZE))
+            yield encoded
 
-            # Add this chunk to the START of the original buffer.
-            decoded = bytearray(buffer) + decoded
+        if first is None:
+            raise ValueError("File is empty")
 
-            end.chunk = codec.encoder(buffer)
-            encoded.extend(end.to_bytes())
-    except (OSError, ValueError) as err:
-        logger.fatal(f"Unable to read binary from file {in_path}: {err}")
-        return 1
-
-    # Construct the metadata message.
-    size = len(decoded)
-    crc = codec.crc32(decoded)
+        # Handle the first chunk last.
+        end = message.End()
+        end.chunk = codec.encoder(first)
 
-    metadata = message.Metadata()
-    metadata.chunk = bytearray(8 * 2)
-    metadata.payload_size = codec.bytes_to_nibbles(
-        bytearray(size.to_bytes(4, byteorder="big"))
-    )
-    metadata.crc = codec.bytes_to_nibbles(
-        bytearray(crc.to_bytes(4, byteorder="big")),
-    )
-    metadata.build = bytearray(
-        str(build).rjust(constant.FIELD_BUILD_SIZE, "0"), "utf-8"
-    )
-
-    # Build the SysEx file.
-    logger.info(f"Input binary file size {size}-bytes (CRC32 0x{crc:08x})")
-    encoded = bytearray(metadata.to_bytes()) + encoded
-    encoded = bytearray(start.to_bytes()) + encoded
+        yield end.to_bytes()
 
     try:
+        logger.info(f"Reading binary from {in_path}")
         logger.info(f"Writing encoded SysEx to {out_path}")
 
-        with open(out_path, "wb") as fout:
-            fout.write(encoded)
-    except OSError as err:
-        logger.fatal(f"Unable to write SysEx to file {out_path}: {err}")
+        with open(in_path, "rb") as fin, _replace(out_path) as fout:
+            # The metadata message requires the size and CRC of the entire input, so
+            # write it with these zeroed as a placeholder and fill them in at the end.
+            metadata = message.Metadata()
+            metadata.chunk = bytearray(8 * 2)
+            metadata.payload_size = bytearray(8)
+            metadata.crc = bytearray(8)
+            metadata.build = bytearray(
+                str(build).rjust(constant.FIELD_BUILD_SIZE, "0"), "utf-8"
+            )
+
+            header = start.to_bytes()
+            placeholder = metadata.to_bytes()
+            fout.write(header)
+            fout.write(placeholder)
+
+            pipeline.run(
+                pipeline.read_blocks(fin, block_size), transform, fout.write, depth
+            )
+
+            metadata.payload_size = codec.bytes_to_nibbles(
+                bytearray(size.to_bytes(4, byteorder="big"))
+            )
+            metadata.crc = codec.bytes_to_nibbles(
+                bytearray(crc.to_bytes(4, byteorder="big")),
+            )
+
+            # The completed message MUST exactly replace the placeholder, otherwise it
+            # would overwrite the start of the first Data message.
+            if len(metadata.to_bytes()) != len(placeholder):
+                raise ValueError("Metadata message does not match its placeholder")
+
+            fout.seek(len(header))
+            fout.write(metadata.to_bytes())
+    except (OSError, ValueError) as err:
+        logger.fatal(f"Unable to encode binary from file {in_path}: {err}")
         return 1
 
+    logger.info(f"Input binary file size {size}-bytes (CRC32 0x{crc:08x})")
+
     return 0
 
 
 # mypy: disable-error-code="attr-defined"
-def decode(filename: str) -> int:
+def decode(
+    filename: str,
+    block_size: int = pipeline.DEFAULT_BLOCK_SIZE,
+    depth: int = pipeline.DEFAULT_QUEUE_DEPTH,
+) -> int:
     """Decodes Novation compatible SysEx to a binary file.
 
     :param filename: The name and path to the file to decode.
+    :param block_size: The size of blocks to read from the input file, in bytes.
+    :param depth: The maximum number of blocks queued between pipeline stages. Zero
+        disables the use of threads.
 
     :return: An exit code indicating if the operation was successful or not. Zero
         means success, any other value failure.
     """
     logger = logging.getLogger(__name__)
-    buffer = bytearray()
-    output = bytearray()
     in_path = pathlib.Path(filename).resolve()
     out_path = f"{in_path}.bin"
 
@@ -153,30 +189,73 @@ def decode(filename: str) -> int:
     crc = int()
     size = int()
 
-    try:
-        logger.info(f"Reading SysEx from {in_path}")
+    # The contents of the End message is the first chunk, and is written last.
+    first = None
+    written = int()
 
-        with open(in_path, "rb") as fin:
-            while True:
-                # All messages have a 6-byte header.
-                offset = fin.tell()
-                buffer = bytearray(fin.read(6))
-                if len(buffer) < 1:
+    def identify(buffer: bytearray) -> Optional[message.Message]:
+        # Determine the message type from the 6-byte header.
+        for candidate in messages:
+            if buffer[4:6] == candidate.identifier:
+                return candidate()
+
+        return None
+
+    def handle(handler: message.Message) -> Optional[bytearray]:
+        nonlocal crc, size, first
+
+        # Handle start messages appropriately.
+        if type(handler) == message.Start:
+            model = "UNKNOWN"
+            manufacturer = "UNKNOWN"
+
+            for name, value in constant.MANUFACTURER_IDS.items():
+                if handler.manufacturer == value:
+                    manufacturer = name
                     break
 
-                # Determine the message type.
-                for candidate in messages:
-                    handler = None
+            for name, value in constant.MODEL_IDS.items():
+                if handler.model == value:
+                    model = name
+
+            logger.info(f"SysEx file appears to be for {manufacturer} {model}")
+
+        # Handle metadata appropriately.
+        if type(handler) == message.Metadata:
+            build = str(handler.build, "utf-8")
+            size = int.from_bytes(
+                codec.nibbles_to_bytes(handler.payload_size), byteorder="big"
+            )
+            crc = int.from_bytes(codec.nibbles_to_bytes(handler.crc), byteorder="big")
+            logger.info(f"SysEx file appears to contain build {build}")
+            logger.info(f"Encoded file size {size}-bytes (CRC32 0x{crc:08x})")
+
+        # Handle the chunk appropriately.
+        if type(handler) == message.Data:
+            return codec.decoder(handler.chunk)
+
+        # The contents of the last message is the first chunk.
+        if type(handler) == message.End:
+            if first is not None:
+                raise ValueError("Multiple End messages found in file")
 
-                    if buffer[4:6] == candidate.identifier:
-                        handler = candidate()
+            first = codec.decoder(handler.chunk)
 
-                        # Read in the whole message, including the trailing SysEx EOX.
-                        buffer.extend(bytearray(fin.read(handler.size())))
-                        buffer.extend(bytearray(fin.read(1)))
-                        handler.from_bytes(buffer)
-                        logger.debug(f"Found '{handler.name}' {offset}-bytes into file")
-                        break
+        return None
+
+    def transform(blocks: Iterator[bytearray]) -> Iterator[bytearray]:
+        buffer = bytearray()
+        offset = int()
+
+        for block in blocks:
+            buffer.extend(block)
+            output = bytearray()
+            position = 0
+
+            # All messages have a 6-byte header. Messages may span blocks, so anything
+            # left over is carried into the next block.
+            while len(buffer) - position >= 6:
+                handler = identify(buffer[position : position + 6])
 
                 # No handler? No support for this message.
                 if not handler:
@@ -184,53 +263,98 @@ def decode(filename: str) -> int:
                         f"Unsupported SysEx message found {offset}-bytes into file"
                     )
 
-                # Handle start messages appropriately.
-                if type(handler) == message.Start:
-                    model = "UNKNOWN"
-                    manufacturer = "UNKNOWN"
+                # Read in the whole message, including the trailing SysEx EOX.
+                length = 6 + handler.size() + 1
+                if len(buffer) - position < length:
+                    break
 
-                    for name, value in constant.MANUFACTURER_IDS.items():
-                        if handler.manufacturer == value:
-                            manufacturer = name
-                            break
+                handler.from_bytes(buffer[position : position + length])
+                logger.debug(f"Found '{handler.name}' {offset}-bytes into file")
 
-                    for name, value in constant.MODEL_IDS.items():
-                        if handler.model == value:
-                            model = name
+                chunk = handle(handler)
+                if chunk is not None:
+                    output.extend(chunk)
 
-                    logger.info(f"SysEx file appears to be for {manufacturer} {model}")
+                position += length
+                offset += length
 
-                # Handle metadata appropriately.
-                if type(handler) == message.Metadata:
-                    build = str(handler.build, "utf-8")
-                    size = int.from_bytes(
-                        codec.nibbles_to_bytes(handler.payload_size), byteorder="big"
-                    )
-                    crc = int.from_bytes(
-                        codec.nibbles_to_bytes(handler.crc), byteorder="big"
-                    )
-                    logger.info(f"SysEx file appears to contain build {build}")
-                    logger.info(f"Encoded file size {size}-bytes (CRC32 0x{crc:08x})")
+            buffer = buffer[position:]
+            yield output
 
-                # Handle the chunk appropriately.
-                if type(handler) == message.Data:
-                    chunk = codec.decoder(handler.chunk)
-                    output.extend(chunk)
+        if buffer:
+            if identify(buffer):
+                raise ValueError(
+                    f"Truncated SysEx message found {offset}-bytes into file"
+                )
+
+            raise ValueError(
+                f"Unsupported SysEx message found {offset}-bytes into file"
+            )
+
+    def write(chunk: bytearray):
+        nonlocal written
+        fout.write(chunk)
+        written += len(chunk)
+
+    try:
+        logger.info(f"Reading SysEx from {in_path}")
+        logger.info(f"Writing decoded SysEx to {out_path}")
+
+        with open(in_path, "rb") as fin, _replace(out_path) as fout:
+            # Data chunks follow the first chunk, which is only known at the end.
+            fout.seek(constant.FIELD_CHUNK_SIZE)
+            pipeline.run(pipeline.read_blocks(fin, block_size), transform, write, depth)
 
-                # The contents of the last message is the first chunk.
-                if type(handler) == message.End:
-                    chunk = codec.decoder(handler.chunk)
-                    output = chunk + output
+            if first is None:
+                raise ValueError("No End message found in file")
 
+            fout.seek(0)
+            fout.write(first)
+            fout.truncate(min(size, len(first) + written))
+    except (OSError, ValueError) as err:
+        logger.fatal(f"Unable to decode SysEx from file {in_path}: {err}")
+        return 1
+
+    return 0
+
+
+def extract(filename: str, offset: int, length: int) -> int:
+    """Extracts a range of bytes from the binary in a Novation compatible SysEx file.
+
+    Only the messages containing the requested range are read and decoded, rather than
+    decoding the entire file.
+
+    :param filename: The name and path to the file to extract from.
+    :param offset: The offset into the decoded binary to extract from, in bytes.
+    :param length: The number of bytes to extract.
+
+    :return: An exit code indicating if the operation was successful or not. Zero
+        means success, any other value failure.
+    """
+    logger = logging.getLogger(__name__)
+    in_path = pathlib.Path(filename).resolve()
+    out_path = f"{in_path}.0x{offset:08x}-0x{length:x}.bin"
+
+    try:
+        logger.info(f"Reading SysEx from {in_path}")
+
+        with open(in_path, "rb") as fin:
+            image = firmware.Firmware(fin)
+            logger.info(f"SysEx file appears to contain build {image.build}")
+            logger.info(
+                f"Encoded file size {image.size}-bytes (CRC32 0x{image.crc:08x})"
+            )
+
+            output = image.read(offset, length)
     except (OSError, ValueError) as err:
         logger.fatal(f"Unable to read SysEx from file {in_path}: {err}")
         return 1
 
     try:
-        logger.info(f"Writing decoded SysEx to {out_path}")
+        logger.info(f"Writing {length}-bytes from offset 0x{offset:08x} to {out_path}")
 
         with open(out_path, "wb") as fout:
-            fout.write(output[0:size])
+            fout.write(output)
     except OSError as err:
         logger.fatal(f"Unable to write binary to file {out_path}: {err}")
         return 1
@@ -238,6 +362,66 @@ def decode(filename: str) -> int:
     return 0
 
 
+def _bounded_integer(minimum: int) -> Callable[[str], int]:
+    """Returns an argument type which parses integers no smaller than a minimum.
+
+    Integers may be prefixed to indicate their base, such as 0x for hexadecimal.
+
+    :param minimum: The smallest value to accept.
+
+    :return: A function which parses an argument, raising an argparse error if the
+        argument is not an integer, or is smaller than the minimum.
+    """
+
+    def parse(value: str) -> int:
+        try:
+            number = int(value, 0)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid integer value: '{value}'")
+
+        if number < minimum:
+            raise argparse.ArgumentTypeError(f"must be at least {minimum}: '{value}'")
+
+        return number
+
+    return parse
+
+
+@contextlib.contextmanager
+def _replace(path: str) -> Iterator[BinaryIO]:
+    """Opens a temporary file to write to, which replaces the given file on success.
+
+    This ensures that any existing file is left untouched if writing fails partway.
+
+    :param path: The name and path to the file to replace.
+
+    :return: A context manager which yields the temporary file to write to.
+    """
+    descriptor, temporary = tempfile.mkstemp(
+        dir=os.path.dirname(path), prefix=f"{os.path.basename(path)}.", suffix=".tmp"
+    )
+    fout = os.fdopen(descriptor, "wb")
+
+    try:
+        with fout:
+            # Temporary files are only readable by their owner, so apply the
+            # permissions that the output would have been created with by open().
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(temporary, 0o666 & ~umask)
+
+            yield fout
+
+        os.replace(temporary, path)
+    except BaseException:
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+
+        raise
+
+
 def entrypoint():
     """The main xKey CLI entrypoint."""
 
@@ -276,6 +460,39 @@ def entrypoint():
     decoder = subparser.add_parser("decode", help="Decode SysEx to binary.")
     decoder.add_argument("filename", help="The path to the file to process")
 
+    # Extraction sub-command specific arguments.
+    extractor = subparser.add_parser(
+        "extract", help="Extract a range of bytes from SysEx to binary."
+    )
+    extractor.add_argument("filename", help="The path to the file to process")
+    extractor.add_argument(
+        "--offset",
+        type=_bounded_integer(0),
+        help="The offset into the binary to extract from, in bytes.",
+        required=True,
+    )
+    extractor.add_argument(
+        "--length",
+        type=_bounded_integer(0),
+        help="The number of bytes to extract.",
+        required=True,
+    )
+
+    # Pipeline arguments shared by encoding and decoding.
+    for command in [encoder, decoder]:
+        command.add_argument(
+            "--block-size",
+            type=_bounded_integer(1),
+            help="The size of blocks to read from the input file, in bytes.",
+            default=pipeline.DEFAULT_BLOCK_SIZE,
+        )
+        command.add_argument(
+            "--queue-depth",
+            type=_bounded_integer(0),
+            help="The number of blocks to queue between stages, zero disables threads.",
+            default=pipeline.DEFAULT_QUEUE_DEPTH,
+        )
+
     # Parse.
     arguments = parser.parse_args()
 
@@ -287,10 +504,23 @@ def entrypoint():
 
     # Dispatch.
     if arguments.subparser == "encode":
-        sys.exit(encode(arguments.filename, arguments.model, arguments.build))
+        sys.exit(
+            encode(
+                arguments.filename,
+                arguments.model,
+                arguments.build,
+                arguments.block_size,
+                arguments.queue_depth,
+            )
+        )
 
     if arguments.subparser == "decode":
-        sys.exit(decode(arguments.filename))
+        sys.exit(
+            decode(arguments.filename, arguments.block_size, arguments.queue_depth)
+        )
+
+    if arguments.subparser == "extract":
+        sys.exit(extract(arguments.filename, arguments.offset, arguments.length))
 
     parser.print_help()
     sys.exit(1)
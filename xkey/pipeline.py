@@ -0,0 +1,165 @@
+"""Provides a bounded-queue pipeline to overlap file I/O with SysEx processing."""
+
+import queue
+import threading
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, List
+
+# The default maximum number of blocks queued between each stage of the pipeline.
+DEFAULT_QUEUE_DEPTH = 4
+
+# The default size of blocks read from input files, in bytes. This is kept small
+# relative to typical firmware updates, so that there are enough blocks in flight for
+# reads and writes to overlap with encoding and decoding.
+DEFAULT_BLOCK_SIZE = 4 * 1024
+
+# How often, in seconds, a blocked stage checks whether the pipeline has been stopped.
+POLL_INTERVAL = 0.1
+
+# Marks the end of the items on a queue.
+_SENTINEL = object()
+
+
+class _Stopped(Exception):
+    """Raised inside a stage when another stage of the pipeline has failed."""
+
+
+def _put(sink: "queue.Queue[Any]", item: Any, stop: threading.Event):
+    """Places an item on a queue, blocking until there is room or the pipeline stops.
+
+    :param sink: The queue to place the item on.
+    :param item: The item to place on the queue.
+    :param stop: An event which is set when the pipeline has been stopped.
+
+    :raises _Stopped: The pipeline was stopped before the item could be queued.
+    """
+    while True:
+        if stop.is_set():
+            raise _Stopped()
+
+        try:
+            sink.put(item, timeout=POLL_INTERVAL)
+            return
+        except queue.Full:
+            continue
+
+
+def _drain(source: "queue.Queue[Any]", stop: threading.Event) -> Iterator[Any]:
+    """Yields items from a queue until the end of the queue is reached.
+
+    :param source: The queue to read items from.
+    :param stop: An event which is set when the pipeline has been stopped.
+
+    :raises _Stopped: The pipeline was stopped before the end of the queue was reached.
+
+    :return: An iterator of items from the queue.
+    """
+    while True:
+        if stop.is_set():
+            raise _Stopped()
+
+        try:
+            item = source.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            continue
+
+        if item is _SENTINEL:
+            return
+
+        yield item
+
+
+def read_blocks(fin: BinaryIO, size: int = DEFAULT_BLOCK_SIZE) -> Iterator[bytearray]:
+    """Reads blocks from a file until the end of the file is reached.
+
+    :param fin: The file to read blocks from.
+    :param size: The size of each block to read, in bytes. Only the final block may be
+        shorter than this.
+
+    :raises ValueError: The provided block size is not positive.
+
+    :return: An iterator of blocks read from the file.
+    """
+    if size < 1:
+        raise ValueError("Block size must be positive")
+
+    while True:
+        buffer = bytearray(fin.read(size))
+        if len(buffer) < 1:
+            break
+
+        yield buffer
+
+
+def run(
+    reader: Iterable[Any],
+    transform: Callable[[Iterator[Any]], Iterable[Any]],
+    writer: Callable[[Any], Any],
+    depth: int = DEFAULT_QUEUE_DEPTH,
+):
+    """Runs a reader, transform and writer as a pipeline.
+
+    The reader and transform are each run in their own thread, with a bounded queue
+    between each stage, while the writer is run in the calling thread. This allows
+    reads and writes to overlap with the transform. If the queue depth is zero, all
+    stages are run serially in the calling thread instead.
+
+    :param reader: An iterable which yields blocks read from the input.
+    :param transform: A callable which is passed an iterator of blocks from the reader,
+        and returns an iterable of blocks to be passed to the writer.
+    :param writer: A callable which is called with each block from the transform.
+    :param depth: The maximum number of blocks queued between each stage.
+
+    :raises ValueError: The provided queue depth is negative.
+
+    Any exception raised by a stage is re-raised in the calling thread once all stages
+    have stopped.
+    """
+    if depth < 0:
+        raise ValueError("Pipeline queue depth must not be negative")
+
+    if depth == 0:
+        for item in transform(iter(reader)):
+            writer(item)
+        return
+
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    inbound: "queue.Queue[Any]" = queue.Queue(maxsize=depth)
+    outbound: "queue.Queue[Any]" = queue.Queue(maxsize=depth)
+
+    def stage(source: Callable[[], Iterable[Any]], sink: "queue.Queue[Any]"):
+        try:
+            for item in source():
+                _put(sink, item, stop)
+
+            _put(sink, _SENTINEL, stop)
+        except _Stopped:
+            pass
+        except BaseException as err:
+            errors.append(err)
+            stop.set()
+
+    threads = [
+        threading.Thread(target=stage, args=(lambda: reader, inbound), daemon=True),
+        threading.Thread(
+            target=stage,
+            args=(lambda: transform(_drain(inbound, stop)), outbound),
+            daemon=True,
+        ),
+    ]
+
+    for thread in threads:
+        thread.start()
+
+    try:
+        for item in _drain(outbound, stop):
+            writer(item)
+    except _Stopped:
+        pass
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
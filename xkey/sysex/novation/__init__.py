@@ -2,4 +2,5 @@
 
 from xkey.sysex.novation import codec  # noqa: F401
 from xkey.sysex.novation import constant  # noqa: F401
+from xkey.sysex.novation import firmware  # noqa: F401
 from xkey.sysex.novation import message  # noqa: F401
@@ -0,0 +1,138 @@
+"""Random access to firmware encoded in Novation SysEx files."""
+
+import os
+from typing import BinaryIO, List, Type, TypeVar
+
+from xkey.sysex.novation import codec, message
+from xkey.sysex.novation.constant import FIELD_CHUNK_SIZE
+
+MessageType = TypeVar("MessageType", bound=message.Message)
+
+
+# mypy: disable-error-code="attr-defined"
+class Firmware:
+    """Provides random access to firmware encoded in a Novation SysEx file.
+
+    A Novation SysEx file contains a Start and Metadata message, followed by a Data
+    message for each chunk of the firmware, and finally an End message. As Data and End
+    messages are a fixed size, and the End message contains the FIRST chunk, the
+    message containing any byte of the firmware can be located without reading the
+    rest of the file.
+    """
+
+    def __init__(self, fin: BinaryIO):
+        """Reads the Start and Metadata messages from a SysEx file.
+
+        :param fin: A seekable file containing Novation SysEx.
+
+        :raises ValueError: The file does not appear to contain Novation SysEx.
+        """
+        self.fin = fin
+        self.start = self._read(0, message.Start)[0]
+        self.metadata = self._read(self._length(message.Start), message.Metadata)[0]
+
+        # Data messages immediately follow the Start and Metadata messages.
+        self.offset = self._length(message.Start) + self._length(message.Metadata)
+
+        fin.seek(0, os.SEEK_END)
+        remaining = fin.tell() - self.offset
+        self.chunks = remaining // self._length(message.Data)
+
+        # Every remaining message is a Data message, other than the End message.
+        if self.chunks < 1 or remaining % self._length(message.Data):
+            raise ValueError("SysEx file contains an unexpected number of messages")
+
+        self.build = str(self.metadata.build, "utf-8")
+        self.size = int.from_bytes(
+            codec.nibbles_to_bytes(self.metadata.payload_size), byteorder="big"
+        )
+        self.crc = int.from_bytes(
+            codec.nibbles_to_bytes(self.metadata.crc), byteorder="big"
+        )
+
+        if self.size > self.chunks * FIELD_CHUNK_SIZE:
+            raise ValueError("SysEx file is smaller than the size in its metadata")
+
+    def _length(self, candidate: Type[message.Message]) -> int:
+        """Returns the size of a message, in bytes, including its header and trailer.
+
+        :param candidate: The type of message to return the size of.
+
+        :return: The size of the message, in bytes.
+        """
+        return 6 + candidate().size() + 1
+
+    def _read(
+        self, offset: int, candidate: Type[MessageType], count: int = 1
+    ) -> List[MessageType]:
+        """Reads consecutive messages of the same type from the file.
+
+        :param offset: The offset into the file of the first message, in bytes.
+        :param candidate: The type of message to read.
+        :param count: The number of messages to read.
+
+        :raises ValueError: The file does not contain the expected messages.
+
+        :return: The messages read from the file.
+        """
+        length = self._length(candidate)
+
+        self.fin.seek(offset)
+        buffer = bytearray(self.fin.read(length * count))
+        if len(buffer) < length * count:
+            raise ValueError(f"Truncated SysEx message found {offset}-bytes into file")
+
+        messages = []
+        for index in range(0, len(buffer), length):
+            handler = candidate()
+            handler.from_bytes(buffer[index : index + length])
+            messages.append(handler)
+
+        return messages
+
+    def read(self, offset: int, length: int) -> bytearray:
+        """Reads and decodes a range of bytes from the firmware.
+
+        Only the messages containing the requested range are read and decoded.
+
+        :param offset: The offset into the firmware to read from, in bytes.
+        :param length: The number of bytes to read.
+
+        :raises ValueError: The requested range is outside of the firmware.
+
+        :return: The decoded bytes from the requested range of the firmware.
+        """
+        if offset < 0 or length < 0 or offset + length > self.size:
+            raise ValueError(
+                f"Range {offset}-{offset + length} is outside of the firmware"
+            )
+
+        if length == 0:
+            return bytearray()
+
+        first = offset // FIELD_CHUNK_SIZE
+        last = (offset + length - 1) // FIELD_CHUNK_SIZE
+        handlers: List[message.Message] = []
+
+        # The first chunk is stored in the End message, at the end of the file.
+        if first == 0:
+            end = self.offset + (self.chunks - 1) * self._length(message.Data)
+            handlers.extend(self._read(end, message.End))
+
+        # Every other chunk is stored in consecutive Data messages.
+        if last > 0:
+            start = max(first, 1)
+            handlers.extend(
+                self._read(
+                    self.offset + (start - 1) * self._length(message.Data),
+                    message.Data,
+                    last - start + 1,
+                )
+            )
+
+        output = bytearray()
+        for handler in handlers:
+            output.extend(codec.decoder(handler.chunk))
+
+        skip = offset - first * FIELD_CHUNK_SIZE
+        return output[skip : skip + length]